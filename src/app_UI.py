@@ -58,6 +58,18 @@ class UI(QWidget):
         self.reset_btn = QPushButton('Reset', self)
         self.grid.addWidget(self.reset_btn, 10, 5)
 
+        # DIFF
+        self.diff_btn = QPushButton('Diff', self)
+        self.grid.addWidget(self.diff_btn, 10, 6)
+
+        # EXPORT
+        self.export_btn = QPushButton('Export', self)
+        self.grid.addWidget(self.export_btn, 10, 7)
+
+        # IMPORT
+        self.import_btn = QPushButton('Import', self)
+        self.grid.addWidget(self.import_btn, 10, 8)
+
     def init_tree_views(self):
 
         self.remote_tree = QTreeWidget(self)
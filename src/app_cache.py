@@ -0,0 +1,53 @@
+import json
+import os
+
+
+CACHE_PATH = 'database//cache.json'
+FIELDS = ('id', 'parent', 'name', 'value', 'deleted')
+SCALARS = (str, int, float, bool, type(None))
+
+
+def save_cache(storage, touched, path=CACHE_PATH):
+    """
+    Saves local cache with ids touched by user's edits. File is replaced atomically, so it can not be broken
+    if application is closed while saving. Children are not saved, they are restored from parents on loading.
+    :param storage: DBStorage
+    :param touched: iterable of ids, which differ from remote database
+    :param path: str
+    :return: None
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as cache:
+        json.dump({'items': [{field: item_raw[field] for field in FIELDS} for item_id, item_raw in storage],
+                   'touched': sorted(touched)}, cache)
+    os.replace(tmp_path, path)
+
+
+def load_cache(path=CACHE_PATH):
+    """
+    Loads local cache saved by save_cache. Missing or broken file means empty cache. Only node fields with
+    scalar values are taken from items.
+    :param path: str
+    :return: (list of raw nodes, list of touched ids)
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as cache:
+            data = json.load(cache)
+    except (OSError, ValueError):
+        return [], []
+
+    if not isinstance(data, dict):
+        return [], []
+
+    items = data.get('items', [])
+    touched = data.get('touched', [])
+    if not isinstance(items, list) or not isinstance(touched, list):
+        return [], []
+    if not all(isinstance(item_raw, dict) and item_raw.get('id') for item_raw in items):
+        return [], []
+
+    items = [{field: item_raw[field] for field in FIELDS if field in item_raw} for item_raw in items]
+    if not all(isinstance(val, SCALARS) for item_raw in items for val in item_raw.values()):
+        return [], []
+
+    return items, [str(item_id) for item_id in touched]
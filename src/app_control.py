@@ -1,23 +1,31 @@
+import csv
 from src.app_UI import UI, NameValDialog
-from PyQt5.QtWidgets import QTreeWidgetItem, QMessageBox
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QTreeWidgetItem, QMessageBox, QFileDialog, QInputDialog
+from PyQt5.QtGui import QBrush
+from PyQt5.QtCore import Qt, QTimer
 
 
 class MyApp(UI):
     """
     Class MyApp binds UI and the model.
     """
+    TRANSFER_FILTER = 'JSON lines (*.jsonl);;CSV (*.csv)'
+    CACHE_SAVE_PERIOD = 60000  # ms
+
     def __init__(self, db_manager):
         """
         Add into MyApp db_manager model and create an empty storage for
-        QTreeWidgetItem
+        QTreeWidgetItem. Storages of both treeViews and ids highlighted in them are kept for painting differences.
         :return: None
         """
         super().__init__()
 
         self.db_control = db_manager
         self.tree_storage = dict()
+        self.tree_items = dict()
+        self.painted = dict()
         self.download_base()
+        self.restore_cache()
 
     def init_buttons(self):
         """
@@ -31,6 +39,9 @@ class MyApp(UI):
         self.rename_btn.clicked.connect(self.on_rename_btn_clicked)
         self.apply_btn.clicked.connect(self.on_apply_btn_clicked)
         self.reset_btn.clicked.connect(self.on_reset_btn_clicked)
+        self.diff_btn.clicked.connect(self.on_diff_btn_clicked)
+        self.export_btn.clicked.connect(self.on_export_btn_clicked)
+        self.import_btn.clicked.connect(self.on_import_btn_clicked)
 
     def download_base(self):
         """
@@ -39,6 +50,27 @@ class MyApp(UI):
         """
         self.renew_tree('remote', self.db_control.get_remote_storage())
 
+    def restore_cache(self):
+        """
+        Restores local cache from previous session and starts its periodic saving.
+        :return: None
+        """
+        tree, data = self.db_control.load_cache()
+        self.renew_tree(tree, data)
+
+        self.cache_timer = QTimer(self)
+        self.cache_timer.timeout.connect(self.db_control.save_cache)
+        self.cache_timer.start(self.CACHE_SAVE_PERIOD)
+
+    def closeEvent(self, event):
+        """
+        Saves local cache on exit.
+        :param event: QCloseEvent
+        :return: None
+        """
+        self.db_control.save_cache()
+        super().closeEvent(event)
+
     def renew_tree(self, tree, data=None):
         """
         Renew data in QTreeWidget. If tree is not local or remote, data will be reset.
@@ -53,11 +85,15 @@ class MyApp(UI):
         else:
             self.local_tree.clear()
             self.remote_tree.clear()
+            self.tree_items = dict()
+            self.painted = dict()
             return
 
         self.tree_storage = dict()
         treeview.clear()
         self.make_items(treeview, data)
+        self.tree_items[tree] = self.tree_storage
+        self.paint_diff()
 
     def make_items(self, tree, data):
         """
@@ -95,10 +131,48 @@ class MyApp(UI):
         store[item_id].setData(1, 0, item_id)
         store[item_id].setData(2, 0, item_raw['value'])
         store[item_id].setExpanded(True)
+        self.paint_qitem(store[item_id], deleted)
+
+    @staticmethod
+    def paint_qitem(qitem, deleted, kinds=()):
+        """
+        Paints QTreeWidgetItem background. Deleted items are always red. Differences are painted on the others:
+        added ones are green, renamed and revalued cells are yellow, items which are deleted in local cache only
+        are gray in the remote treeView.
+        :param qitem: QTreeWidgetItem
+        :param deleted: bool
+        :param kinds: kinds of differences between local cache and remote database
+        :return: None
+        """
+        brushes = [QBrush()] * 3
         if deleted:
-            store[item_id].setBackground(0, Qt.red)
-            store[item_id].setBackground(1, Qt.red)
-            store[item_id].setBackground(2, Qt.red)
+            brushes = [QBrush(Qt.red)] * 3
+        elif 'deleted' in kinds:
+            brushes = [QBrush(Qt.lightGray)] * 3
+        elif 'added' in kinds:
+            brushes = [QBrush(Qt.green)] * 3
+        else:
+            if 'renamed' in kinds:
+                brushes[0] = QBrush(Qt.yellow)
+            if 'revalued' in kinds:
+                brushes[2] = QBrush(Qt.yellow)
+
+        for column, brush in enumerate(brushes):
+            qitem.setBackground(column, brush)
+
+    def paint_diff(self):
+        """
+        Highlights differences between local cache and remote database in both treeViews.
+        Only changed items and items which were highlighted before are repainted.
+        :return: None
+        """
+        diff = self.db_control.get_diff()
+        for tree, store in self.tree_items.items():
+            for item_id in self.painted.get(tree, set()) | set(diff):
+                if item_id in store:
+                    deleted = self.db_control.is_deleted(item_id, store=tree)
+                    self.paint_qitem(store[item_id], deleted, diff.get(item_id, ()))
+            self.painted[tree] = set(diff)
 
     def get_current_id(self, tree='remote'):
         """
@@ -186,6 +260,61 @@ class MyApp(UI):
         self.renew_tree(tree, data)
         self.download_btn.setEnabled(True)
 
+    def on_diff_btn_clicked(self):
+        """
+        Diff button handler. Shows items which differ between local cache and remote database.
+        :return: None
+        """
+        summary = self.db_control.get_diff_summary()
+        lines = ['{}: {}'.format(kind, ', '.join(ids) if ids else '-') for kind, ids in summary.items()]
+        QMessageBox.information(self, 'Differences', '\n'.join(lines))
+
+    def on_export_btn_clicked(self):
+        """
+        Export button handler. Asks for treeView and file and exports subtree of item selected in that treeView.
+        :return: None
+        """
+        store, ok = QInputDialog.getItem(self, 'Export subtree', 'Export from:', ['local', 'remote'], 0, False)
+        if not ok:
+            return
+
+        item_id = self.get_current_id(tree=store)
+        if not item_id:
+            QMessageBox.warning(self, 'Message', 'Select item in {} treeView to export.'.format(store))
+        else:
+            path, _ = QFileDialog.getSaveFileName(self, 'Export subtree', '', self.TRANSFER_FILTER)
+            if path:
+                try:
+                    count = self.db_control.export_subtree(item_id, path, store=store)
+                    QMessageBox.information(self, 'Message', '{} items were exported.'.format(count))
+                except (ValueError, csv.Error, OSError) as err:
+                    QMessageBox.critical(self, 'Message', 'Export failed: {}.'.format(err))
+
+    def on_import_btn_clicked(self):
+        """
+        Import button handler. Asks for file and imports subtree into local cache under selected item.
+        If nothing is selected in local treeView, subtree root becomes a top level item.
+        Broken file stops the import, items imported before it are kept.
+        :return: None
+        """
+        parent_id = self.get_current_id(tree='local')
+        if parent_id and self.db_control.is_deleted(parent_id, store='local'):
+            warn_text = 'Id{} was deleted. You can not import items into it.'.format(parent_id)
+            QMessageBox.critical(self, 'Message', warn_text)
+            return
+
+        path, _ = QFileDialog.getOpenFileName(self, 'Import subtree', '', self.TRANSFER_FILTER)
+        if path:
+            try:
+                tree, data = self.db_control.import_subtree(path, parent=parent_id)
+                msg = '{} items were imported.'.format(self.db_control.imported)
+                QMessageBox.information(self, 'Message', msg)
+            except (ValueError, csv.Error, OSError) as err:
+                tree, data = 'local', self.db_control.get_local_storage()
+                msg = 'Import was stopped: {}. {} items were imported.'.format(err, self.db_control.imported)
+                QMessageBox.critical(self, 'Message', msg)
+            self.renew_tree(tree, data)
+
     def on_reset_btn_clicked(self):
         """
         Reset button handler. Sends reset command to model and renews trees.
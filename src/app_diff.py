@@ -0,0 +1,95 @@
+class CacheDiff:
+    """
+    Class CacheDiff describes differences between local cache and remote database.
+    It remembers only ids touched by user's edits, so kinds of changes are computed for them only.
+    """
+    KINDS = ('added', 'renamed', 'revalued', 'deleted')
+
+    def __init__(self, local_storage, remote_storage):
+        """
+        :param local_storage: DBStorage
+        :param remote_storage: RemoteDB
+        """
+        self.local_storage = local_storage
+        self.remote_storage = remote_storage
+        self.touched = set()
+
+    def touch(self, item_ids):
+        """
+        Marks items as possibly changed.
+        :param item_ids: iterable of ids
+        :return: None
+        """
+        self.touched.update(str(item_id) for item_id in item_ids)
+
+    def track(self, items):
+        """
+        Marks items as possibly changed while they are streamed through.
+        :param items: iterable of Node
+        :return: generator of Node
+        """
+        for item in items:
+            self.touched.add(item.id)
+            yield item
+
+    def get_kinds(self, item_id):
+        """
+        Compares local item with remote one.
+        :param item_id: str
+        :return: list of kinds of changes, empty if item is the same.
+        """
+        local = self.local_storage.storage.get(item_id)
+        remote = self.remote_storage.storage.get(item_id)
+        kinds = []
+        if not local:
+            return kinds
+
+        if not remote:
+            kinds.append('added')
+        else:
+            if local.name != remote.name:
+                kinds.append('renamed')
+            if local.value != remote.value:
+                kinds.append('revalued')
+
+        if local.deleted and not (remote and remote.deleted):
+            kinds.append('deleted')
+
+        return kinds
+
+    def get_changes(self):
+        """
+        Gets changed items. Touched items without changes are forgotten.
+        :return: dict() id -> list of kinds
+        """
+        changes = dict()
+        for item_id in list(self.touched):
+            kinds = self.get_kinds(item_id)
+            if kinds:
+                changes[item_id] = kinds
+            else:
+                self.touched.discard(item_id)
+
+        return changes
+
+    def get_summary(self):
+        """
+        Groups changed items by kinds.
+        :return: dict() kind -> sorted list of ids
+        """
+        summary = {kind: [] for kind in self.KINDS}
+        for item_id, kinds in self.get_changes().items():
+            for kind in kinds:
+                summary[kind].append(item_id)
+
+        for kind in summary:
+            summary[kind].sort()
+
+        return summary
+
+    def reset(self):
+        """
+        Forgets all of changes.
+        :return: None
+        """
+        self.touched = set()
@@ -0,0 +1,119 @@
+from bisect import bisect_left, insort
+
+
+class TreeIndex:
+    """
+    Class TreeIndex describes hierarchical index of storage. Every node is labeled with its ancestor path - tuple of
+    ids from the topmost known ancestor to the node itself. Paths are kept sorted, so any subtree is a contiguous range
+    of this list in pre-order.
+    """
+    def __init__(self):
+        """
+        paths - dict() id -> ancestor path.
+        parents - dict() id -> declared parent id (parent may be not indexed yet).
+        children - dict() parent id -> list of declared children ids.
+        order - sorted list of ancestor paths.
+        roots - set() of nodes, which parents are not indexed.
+        """
+        self.paths = dict()
+        self.parents = dict()
+        self.children = dict()
+        self.order = []
+        self.roots = set()
+
+    def add(self, item_id, parent_id):
+        """
+        Adds node in index. If parent isn't indexed yet, node becomes a root until the parent comes.
+        Nodes, which have been waiting for this node as a parent, are moved under it with their subtrees.
+        Parent can not be changed, so adding of already indexed node makes nothing.
+        :param item_id: str
+        :param parent_id: str
+        :return: None
+        """
+        if item_id in self.paths:
+            return
+
+        path = self.paths.get(parent_id, ()) + (item_id,)
+        self.paths[item_id] = path
+        self.parents[item_id] = parent_id
+        self.children.setdefault(parent_id, []).append(item_id)
+        insort(self.order, path)
+        if len(path) == 1:
+            self.roots.add(item_id)
+
+        for child_id in self.children.get(item_id, []):
+            self.relabel(child_id, path + (child_id,))
+            self.roots.discard(child_id)
+
+    def relabel(self, item_id, new_path):
+        """
+        Moves subtree of item under the new ancestor path.
+        :param item_id: str
+        :param new_path: tuple of ids
+        :return: None
+        """
+        old_path = self.paths[item_id]
+        lo, hi = self.range(item_id)
+        cut = len(old_path)
+
+        block = [new_path + path[cut:] for path in self.order[lo:hi]]
+        del self.order[lo:hi]
+        pos = bisect_left(self.order, new_path)
+        self.order[pos:pos] = block
+
+        for path in block:
+            self.paths[path[-1]] = path
+
+    def range(self, item_id):
+        """
+        Bounds of subtree in sorted order. All descendants follow the node and are less than the node path with
+        the last id followed by '\0'.
+        :param item_id: str
+        :return: (lo, hi) - slice of self.order
+        """
+        path = self.paths[item_id]
+        upper = path[:-1] + (path[-1] + '\0',)
+        return bisect_left(self.order, path), bisect_left(self.order, upper)
+
+    def subtree(self, item_id):
+        """
+        Enumerates node and all of its descendants in pre-order.
+        :param item_id: str
+        :return: generator of ids
+        """
+        if item_id not in self.paths:
+            return
+        lo, hi = self.range(item_id)
+        for pos in range(lo, hi):
+            yield self.order[pos][-1]
+
+    def ancestors(self, item_id):
+        """
+        Gets known ancestors of node starting from the topmost one.
+        :param item_id: str
+        :return: tuple of ids
+        """
+        return self.paths.get(item_id, (item_id,))[:-1]
+
+    def is_ancestor(self, ancestor_id, item_id):
+        """
+        Is ancestor check. Node is not an ancestor of itself.
+        :param ancestor_id: str
+        :param item_id: str
+        :return: bool
+        """
+        path = self.paths.get(item_id)
+        anc_path = self.paths.get(ancestor_id)
+        if not path or not anc_path or len(anc_path) >= len(path):
+            return False
+
+        return path[len(anc_path) - 1] == ancestor_id
+
+    def is_descendant(self, item_id, ancestor_id):
+        return self.is_ancestor(ancestor_id, item_id)
+
+    def __contains__(self, item_id):
+        return item_id in self.paths
+
+    def __len__(self):
+        return len(self.order)
@@ -1,6 +1,11 @@
 import json
+import zlib
 from copy import copy
 from random import randint
+from src.app_index import TreeIndex
+from src.app_diff import CacheDiff
+from src import app_transfer
+from src import app_cache
 
 
 class Node:
@@ -107,6 +112,15 @@ class Node:
 
         return raw_node
 
+    def checksum(self):
+        """
+        Checksum of node's own content. It used to find out whether copies of node are the same without
+        transmitting them. Children are not included, because they depend on storage content.
+        :return: int
+        """
+        content = json.dumps([self.id, self.parent, self.name, self.value, self.deleted])
+        return zlib.crc32(content.encode('utf-8'))
+
     def __copy__(self):
         return Node(self.pack_raw(is_copy=True))
 
@@ -117,48 +131,88 @@ class DBStorage:
     """
     def __init__(self):
         self.storage = dict()
+        self.index = TreeIndex()
 
-    def add_item(self, item):
+    def add_item(self, item, on_deleted=None):
         """
         Adding item into local cache.
         :param item: Node class.
+        :param on_deleted: callable, it gets list of ids, which have been deleted with item.
         :return: None
         """
-        self.find_relatives(self.storage, item)             # Search relatives
-        self.storage[item.id] = item                        # Add in storage with new relatives
+        self.add_items([item], on_deleted)
+
+    def add_items(self, items, on_deleted=None):
+        """
+        Batched adding of items into local cache. Items are consumed one by one, so it can be fed by generator.
+        Relatives are found through the index instead of scanning the whole storage for every item.
+        :param items: iterable of Node
+        :param on_deleted: callable, it gets list of ids, which have been deleted with every added item.
+        :return: number of added items
+        """
+        count = 0
+        for item in items:
+            self.index.add(item.id, item.parent)                # Put in hierarchical index
+            self.storage[item.id] = item
 
-        if self.storage.get(item.parent):                   # Check for deleted parent.
-            if self.storage[item.parent].deleted:
-                self.del_item(item.id)                      # Delete myself and delete all my children
+            parent = self.storage.get(item.parent)              # Search relatives
+            if parent and item.id not in parent.children:
+                parent.set_child(item.id)
+            for child_id in self.index.children.get(item.id, []):
+                if child_id not in item.children:
+                    item.set_child(child_id)
 
-        if item.deleted:
-            self.del_item(item.id)
+            if item.deleted or self.has_deleted(self.index.ancestors(item.id)):  # Check for deleted ancestors.
+                deleted = self.del_item(item.id)                # Delete myself and delete all my children
+                if on_deleted:
+                    on_deleted(deleted)
+            count += 1
+
+        return count
 
     def del_item(self, item_id):
         """
         Making delete itself and all of its children.
         :param item_id: id of item, which must be deleted
-        :return: None
+        :return: list of deleted ids
         """
-        if item_id in self.storage:
-            self.storage[item_id].del_node()
-            for child_id in self.storage[item_id].children:
-                self.del_item(child_id)
+        deleted = list(self.index.subtree(item_id))
+        for sub_id in deleted:
+            self.storage[sub_id].del_node()
+        return deleted
 
-    @staticmethod
-    def find_relatives(storage, item):
+    def has_deleted(self, item_ids):
         """
-        Finds parent and all the children in storage for item.
-        :param storage: dict()
-        :param item: Node()
-        :return: None
+        Checks whether any of passed items is in storage and deleted.
+        :param item_ids: iterable of ids, ancestors for ex.
+        :return: bool
+        """
+        return any(item_id in self.storage and self.storage[item_id].deleted for item_id in item_ids)
+
+    def is_ancestor(self, ancestor_id, item_id):
+        """
+        Checks whether item is placed under ancestor in storage.
+        :param ancestor_id: str
+        :param item_id: str
+        :return: bool
+        """
+        return self.index.is_ancestor(str(ancestor_id), str(item_id))
+
+    def get_ancestors(self, item_id):
+        """
+        Gets known ancestors of item starting from the topmost one.
+        :param item_id: str
+        :return: tuple of ids
         """
-        if item.parent in storage.keys() and item.id not in storage[item.parent].children:
-            storage[item.parent].set_child(item.id)
+        return self.index.ancestors(str(item_id))
 
-        for item_id, item_node in storage.items():
-            if item_node.parent == item.id and item_id not in item.children:
-                item.set_child(item_node.id)
+    def get_subtree(self, item_id):
+        """
+        Enumerates item and all of its descendants in storage.
+        :param item_id: str
+        :return: generator of ids
+        """
+        return self.index.subtree(str(item_id))
 
     def print_cache(self):
         """
@@ -191,12 +245,21 @@ class DBStorage:
         """
         return self.storage[str(item_id)].pack_raw(is_copy=False)
 
-    def receive_item(self, item):
+    def get_checksums(self, item_ids):
+        """
+        Gets checksums of items in one batch. Items which are absent in storage are skipped.
+        :param item_ids: iterable of ids
+        :return: dict() id -> checksum
+        """
+        return {item_id: self.storage[item_id].checksum() for item_id in item_ids if item_id in self.storage}
+
+    def receive_item(self, item, on_deleted=None):
         """
         :param item: dict() raw_node
+        :param on_deleted: callable, it gets list of ids, which have been deleted with item.
         :return: None
         """
-        self.add_item(item)
+        self.add_item(item, on_deleted)
 
     def reset(self):
         """
@@ -227,9 +290,7 @@ class RemoteDB(DBStorage):
         """
         with open('database//db.txt', 'r') as db:
             raw_dict = json.loads(db.read())
-            for key, val in raw_dict.items():
-                node = Node(val)
-                self.add_item(node)
+            self.add_items(Node(val) for key, val in raw_dict.items())
 
 
 class DBManager:
@@ -238,12 +299,15 @@ class DBManager:
     """
     def __init__(self):
         """
-        Inits DBStorage and RemoteDB instances. Makes ID generator for randomize new ids.
+        Inits DBStorage and RemoteDB instances and tracker of differences between them.
+        Makes ID generator for randomize new ids.
         """
         super().__init__()
         self.local_storage = DBStorage()
         self.remote_storage = RemoteDB()
+        self.diff = CacheDiff(self.local_storage, self.remote_storage)
         self.gen = self.id_gen()
+        self.imported = 0
 
     def pull(self, item_id):
         """
@@ -252,7 +316,10 @@ class DBManager:
         :return: 'local', storage
         """
         item = Node(self.remote_storage.get_item(item_id))
-        self.local_storage.receive_item(item)
+        if self.local_storage.has_deleted(self.get_lineage(item_id)):
+            item.del_node()                     # Some of ancestors has been deleted in cache
+        self.local_storage.receive_item(item, on_deleted=self.diff.touch)
+        self.diff.touch([item.id])
         return 'local', self.get_local_storage()
 
     def commit(self):
@@ -262,6 +329,7 @@ class DBManager:
         """
         for item_id, item in self.local_storage.storage.items():
             self.remote_storage.receive_item(copy(item))
+        self.diff.reset()
         self.renew_local()  # Renew local tree after commit
 
         return 'remote', self.get_remote_storage()
@@ -272,15 +340,29 @@ class DBManager:
         :param item_raw: dict(Node)
         :return: 'local', storage
         """
-        parent = self.local_storage.storage.get(item_raw['parent'])  # Get the parent
-        is_par_del = parent.deleted if parent else False             # Write parent check expression in var
+        parent_id = str(item_raw['parent'])
+        lineage = self.get_lineage(parent_id) + (parent_id,)  # Parent with all known ancestors
+        is_par_del = self.local_storage.has_deleted(lineage)  # Write parent check expression in var
 
         if not is_par_del:                      # If parent hasn't been deleted add new node
             item_raw['id'] = next(self.gen)
             item = Node(item_raw)
             self.local_storage.add_item(item)
+            self.diff.touch([item.id])
         return 'local', self.get_local_storage()
 
+    def get_lineage(self, item_id):
+        """
+        Gets ancestors of item, linked in local cache, and remote ancestors of the topmost of them. So ancestors
+        are found even if some of intermediate nodes have not been pulled in cache.
+        :param item_id: str
+        :return: tuple of ids
+        """
+        item_id = str(item_id)
+        local_lineage = self.local_storage.get_ancestors(item_id)
+        top_id = local_lineage[0] if local_lineage else item_id
+        return self.remote_storage.get_ancestors(top_id) + local_lineage
+
     def renew_local(self):
         """
         Renew local tree when commit changes in remote tree
@@ -299,17 +381,113 @@ class DBManager:
         :return: 'local', storage
         """
         self.local_storage.change_item_volatile(item_id, **kwargs)
+        self.diff.touch([item_id])
         return 'local', self.get_local_storage()
 
     def del_item(self, item_id):
         """
-        Makes item deleted. Must be called by user through the UI.
+        Makes item deleted with all of its descendants in cache, including ones, which are placed under it
+        in remote database only. Must be called by user through the UI.
         :param item_id: str
         :return: 'local', tree
         """
-        self.local_storage.del_item(str(item_id))
+        item_id = str(item_id)
+        if item_id in self.local_storage.storage:
+            under = [root_id for root_id in self.local_storage.index.roots
+                     if self.remote_storage.is_ancestor(item_id, root_id)]
+            for sub_root_id in [item_id] + under:
+                self.diff.touch(self.local_storage.del_item(sub_root_id))
+        return 'local', self.get_local_storage()
+
+    def export_subtree(self, item_id, path, store='local'):
+        """
+        Streams subtree into '.csv' or '.jsonl' file.
+        :param item_id: str id of subtree root
+        :param path: str
+        :param store: 'local' or 'remote'
+        :return: number of exported items
+        """
+        storage = self.local_storage if store == 'local' else self.remote_storage
+        return app_transfer.export_subtree(storage, str(item_id), path)
+
+    def import_subtree(self, path, parent=None):
+        """
+        Streams subtree from '.csv' or '.jsonl' file into cache with new ids. Must be called by user through the UI.
+        Number of imported items is kept in self.imported, so it is known even if broken row stops the import.
+        :param path: str
+        :param parent: str id of new parent for subtree root, if None root becomes a top level node.
+        :return: 'local', storage
+        """
+        self.imported = 0
+        if parent is not None:
+            parent = str(parent)
+            if self.local_storage.has_deleted(self.get_lineage(parent) + (parent,)):
+                return 'local', self.get_local_storage()    # Parent has been deleted, nothing to import
+        items = (Node(item_raw) for item_raw in app_transfer.read_subtree(path, self.gen, parent))
+        self.local_storage.add_items(self.count_imported(self.diff.track(items)), on_deleted=self.diff.touch)
+        return 'local', self.get_local_storage()
+
+    def count_imported(self, items):
+        """
+        Counts items while they are streamed into cache.
+        :param items: iterable of Node
+        :return: generator of Node
+        """
+        for item in items:
+            yield item
+            self.imported += 1
+
+    def save_cache(self, path=app_cache.CACHE_PATH):
+        """
+        Saves local cache with uncommitted changes on disk.
+        :param path: str
+        :return: None
+        """
+        app_cache.save_cache(self.local_storage, self.diff.get_changes(), path)
+
+    def load_cache(self, path=app_cache.CACHE_PATH):
+        """
+        Restores local cache saved in previous session and revalidates it against remote database.
+        Parents can not be changed, so cached items with parent other than in remote database are skipped.
+        :param path: str
+        :return: 'local', storage
+        """
+        items, touched = app_cache.load_cache(path)
+        remote = self.remote_storage.storage
+        items = (Node(item_raw) for item_raw in items)
+        items = (item for item in items if item.id not in remote or remote[item.id].parent == item.parent)
+        self.local_storage.add_items(items, on_deleted=self.diff.touch)
+        self.diff.touch(touched)
+        self.revalidate()
         return 'local', self.get_local_storage()
 
+    def revalidate(self):
+        """
+        Compares checksums of cached items without uncommitted changes with remote ones in one batch and refetches
+        stale items only, in one batched insert. Items, which are absent in remote database, are kept in cache as added.
+        :return: None
+        """
+        clean_ids = [item_id for item_id in self.local_storage.storage if item_id not in self.diff.touched]
+        local_sums = self.local_storage.get_checksums(clean_ids)
+        remote_sums = self.remote_storage.get_checksums(clean_ids)
+
+        self.diff.touch(item_id for item_id in clean_ids if item_id not in remote_sums)
+        stale_ids = [item_id for item_id in clean_ids
+                     if item_id in remote_sums and remote_sums[item_id] != local_sums[item_id]]
+        self.local_storage.add_items(self.diff.track(self.fetch(stale_ids)), on_deleted=self.diff.touch)
+
+    def fetch(self, item_ids):
+        """
+        Makes local copies of remote items. Copy is deleted, if some of its ancestors has been deleted in cache.
+        :param item_ids: iterable of ids
+        :return: generator of Node
+        """
+        for item_id in item_ids:
+            item = Node(self.remote_storage.get_item(item_id))
+            if self.local_storage.has_deleted(self.get_lineage(item_id)):
+                item.del_node()
+            yield item
+
     def id_gen(self):
         """
         Random ID generator. Generation range from 0 to 65535.
@@ -317,7 +495,7 @@ class DBManager:
         """
         while True:
             idg = randint(0, 0xffff)
-            if str(idg) not in self.remote_storage.storage.keys():
+            if str(idg) not in self.remote_storage.storage and str(idg) not in self.local_storage.storage:
                 yield str(idg)
 
     def reset(self):
@@ -327,6 +505,7 @@ class DBManager:
         """
         self.remote_storage.reset()
         self.local_storage.reset()
+        self.diff.reset()
         return 'all'
 
     def get_local_item(self, item_id):
@@ -338,6 +517,20 @@ class DBManager:
     def get_local_storage(self):
         return dict(self.local_storage)
 
+    def get_diff(self):
+        """
+        Gets items which differ between local cache and remote database.
+        :return: dict() id -> list of kinds ('added', 'renamed', 'revalued', 'deleted')
+        """
+        return self.diff.get_changes()
+
+    def get_diff_summary(self):
+        """
+        Gets differences grouped by kinds.
+        :return: dict() kind -> list of ids
+        """
+        return self.diff.get_summary()
+
     def is_deleted(self, item_id, store='local'):
         """
         Is deleted check.
@@ -0,0 +1,100 @@
+import csv
+import json
+
+
+FIELDS = ('id', 'parent', 'name', 'value', 'deleted')
+
+
+def get_format(path):
+    """
+    Gets format of file by its extension. Everything except '.csv' is newline-delimited JSON.
+    :param path: str
+    :return: 'csv'/'jsonl'
+    """
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+def iter_subtree(storage, item_id):
+    """
+    Streams item and all of its descendants from storage in pre-order, so the root of subtree always goes first.
+    :param storage: DBStorage
+    :param item_id: str
+    :return: generator of raw nodes without children
+    """
+    for sub_id in storage.get_subtree(item_id):
+        raw_node = storage.storage[sub_id].pack_raw(is_copy=True)
+        yield {field: raw_node[field] for field in FIELDS}
+
+
+def export_subtree(storage, item_id, path):
+    """
+    Writes subtree into file line by line.
+    :param storage: DBStorage
+    :param item_id: str
+    :param path: path to '.csv' or '.jsonl' file
+    :return: number of written nodes
+    """
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as out:
+        if get_format(path) == 'csv':
+            writer = csv.DictWriter(out, fieldnames=FIELDS)
+            writer.writeheader()
+            for raw_node in iter_subtree(storage, item_id):
+                writer.writerow(raw_node)
+                count += 1
+        else:
+            for raw_node in iter_subtree(storage, item_id):
+                out.write(json.dumps(raw_node) + '\n')
+                count += 1
+
+    return count
+
+
+def read_raw(path):
+    """
+    Reads raw nodes from file line by line.
+    :param path: path to '.csv' or '.jsonl' file
+    :return: generator of raw nodes
+    """
+    with open(path, 'r', newline='', encoding='utf-8') as src:
+        if get_format(path) == 'csv':
+            for row in csv.DictReader(src):
+                row['deleted'] = row.get('deleted') == 'True'
+                yield row
+        else:
+            for line in src:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_subtree(path, ids, parent=None):
+    """
+    Reads subtree from file. Ids from another system can collide with ours, so every node gets new id from ids
+    generator and its parent is rewritten through the map of old ids to new ones. It means that parents must go
+    before their children, as export_subtree writes them. The first node is the root of subtree.
+    :param path: path to '.csv' or '.jsonl' file
+    :param ids: generator of new ids
+    :param parent: str id of new parent for root, if None root becomes a top level node.
+    :return: generator of raw nodes
+    """
+    new_ids = dict()
+    for num, raw_node in enumerate(read_raw(path), 1):
+        if not isinstance(raw_node, dict) or not raw_node.get('id'):
+            raise ValueError('row {} has no id'.format(num))
+
+        raw_node = {field: raw_node[field] for field in FIELDS if field in raw_node}
+        old_id = str(raw_node['id'])
+        old_parent = str(raw_node.get('parent'))
+        if old_id in new_ids:
+            raise ValueError('row {} repeats id {}'.format(num, old_id))
+
+        if not new_ids:
+            raw_node['parent'] = str(parent)
+        elif old_parent in new_ids:
+            raw_node['parent'] = new_ids[old_parent]
+        else:
+            raise ValueError('row {} goes before its parent {}'.format(num, old_parent))
+
+        new_ids[old_id] = next(ids)
+        raw_node['id'] = new_ids[old_id]
+        yield raw_node